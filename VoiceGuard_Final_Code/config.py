@@ -6,6 +6,11 @@ API_KEY_NAME = "x-api-key"
 # For hackathon ease, we set a default but allow env override
 API_KEY = os.getenv("VOICE_GUARD_API_KEY", "voiceguard-secret-key")
 
+# Rate Limiting
+# Per-process memory by default; set VOICE_GUARD_RATE_LIMIT_STORAGE to a Redis URI
+# (e.g. redis://localhost:6379) so every uvicorn/gunicorn worker shares one limit
+RATE_LIMIT_STORAGE_URI = os.getenv("VOICE_GUARD_RATE_LIMIT_STORAGE", "memory://")
+
 # Supported Languages
 SUPPORTED_LANGUAGES = {
     "Tamil", "English", "Hindi", "Malayalam", "Telugu"
@@ -13,3 +18,13 @@ SUPPORTED_LANGUAGES = {
 
 # Supported Formats
 SUPPORTED_FORMATS = {"mp3"}
+
+# Audio Processing
+# Voice F0 stays well below 1 kHz, so 8 kHz keeps every feature we use
+# while cutting the FFT/autocorrelation work versus 22050 Hz
+SAMPLE_RATE = 8000
+
+# Result Cache
+# Classification results are reused for identical payloads for up to 10 minutes
+RESULT_CACHE_SIZE = 1024
+RESULT_CACHE_TTL_SECONDS = 600
@@ -1,35 +1,78 @@
 from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.responses import JSONResponse
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel
+from typing import Literal, get_args
 import uvicorn
 import traceback
 import sys
-import logging
-from pythonjsonlogger import jsonlogger
+import os
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from cachetools import TTLCache
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from fastapi.concurrency import run_in_threadpool
 
 # Add parent directory to path to handle imports if run directly
 # import os
 # sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from config import API_KEY, SUPPORTED_LANGUAGES, SUPPORTED_FORMATS
-from utils import decode_audio
-from model import classifier
+from config import API_KEY, SUPPORTED_LANGUAGES, SUPPORTED_FORMATS, RESULT_CACHE_SIZE, RESULT_CACHE_TTL_SECONDS, RATE_LIMIT_STORAGE_URI
+from utils import setup_logging
+from worker import decode_and_predict
 
 # --- 1. Logging Setup (JSON) ---
-logger = logging.getLogger("voice_guard")
-logHandler = logging.StreamHandler()
-formatter = jsonlogger.JsonFormatter()
-logHandler.setFormatter(formatter)
-logger.addHandler(logHandler)
-logger.setLevel(logging.INFO)
-
-# --- 2. Rate Limiting Setup ---
-limiter = Limiter(key_func=get_remote_address)
-app = FastAPI(title="Voice Guard API")
+logger = setup_logging()
+
+# --- 2. Process Pool Setup ---
+# Decoding and feature extraction are CPU-bound and hold the GIL, so each
+# request runs in a worker process; concurrent requests use all cores
+# (a threadpool would serialize them)
+WORKER_COUNT = os.cpu_count() or 1
+
+def create_executor():
+    # Workers configure their own JSON log handler (spawned workers don't inherit it)
+    return ProcessPoolExecutor(max_workers=WORKER_COUNT, initializer=setup_logging)
+
+async def run_clip(state, audio_base64):
+    """Decodes and classifies one clip in the process pool."""
+    loop = asyncio.get_running_loop()
+    executor = state.executor
+    try:
+        return await loop.run_in_executor(executor, decode_and_predict, audio_base64)
+    except BrokenProcessPool:
+        # A worker died (crash / OOM kill): swap in a fresh pool and retry once
+        if state.executor is executor:
+            logger.error("Process pool broken, recreating it")
+            state.executor = create_executor()
+            executor.shutdown(wait=False, cancel_futures=True)
+        return await loop.run_in_executor(state.executor, decode_and_predict, audio_base64)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.executor = create_executor()
+    yield
+    app.state.executor.shutdown(cancel_futures=True)
+
+# --- 3. Result Cache ---
+# Retries and duplicate uploads skip decoding and feature extraction entirely.
+# Keyed by a digest of the base64 payload (decoding happens in the workers)
+result_cache = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL_SECONDS)
+
+# --- 4. Rate Limiting Setup ---
+# Storage comes from VOICE_GUARD_RATE_LIMIT_STORAGE (see config.py). With Redis,
+# moving-window limits are checked and recorded by one atomic Lua script, and
+# the limiter falls back to per-process memory if Redis becomes unreachable
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=RATE_LIMIT_STORAGE_URI,
+    strategy="moving-window",
+    in_memory_fallback_enabled=True
+)
+app = FastAPI(title="Voice Guard API", lifespan=lifespan)
 app.state.limiter = limiter
 
 # Strict formatted exception handler
@@ -53,28 +96,32 @@ def home():
     }
 
 # --- Schemas ---
+# Literal types are validated natively by pydantic-core (no Python validator call);
+# they mirror SUPPORTED_LANGUAGES / SUPPORTED_FORMATS in config.py
+Language = Literal["Tamil", "English", "Hindi", "Malayalam", "Telugu"]
+AudioFormat = Literal["mp3", "MP3"]
+assert set(get_args(Language)) == SUPPORTED_LANGUAGES
+assert {f.lower() for f in get_args(AudioFormat)} == SUPPORTED_FORMATS
+
 class VoiceDetectionRequest(BaseModel):
-    language: str
-    audioFormat: str
+    language: Language
+    audioFormat: AudioFormat
     audioBase64: str
 
-    @field_validator('language')
-    def validate_language(cls, v):
-        if v not in SUPPORTED_LANGUAGES:
-            raise ValueError(f"Language '{v}' not supported. Must be one of {SUPPORTED_LANGUAGES}")
-        return v
-
-    @field_validator('audioFormat')
-    def validate_format(cls, v):
-        if v.lower() not in SUPPORTED_FORMATS:
-            raise ValueError(f"Format '{v}' not supported. Must be {SUPPORTED_FORMATS}")
-        return v.lower()
-
+# Declaring the response model lets FastAPI serialize successes straight to
+# JSON bytes in pydantic-core, skipping the dict + json.dumps round trip
+# (FastAPI >= 0.130, pinned in requirements.txt)
+class VoiceDetectionResponse(BaseModel):
+    status: str
+    language: str
+    classification: str
+    confidenceScore: float
+    explanation: str
 
 
 # --- Endpoints ---
 
-@app.post("/api/voice-detection")
+@app.post("/api/voice-detection", response_model=VoiceDetectionResponse)
 @limiter.limit("10/minute")  # Limit: 10 requests per minute per IP
 async def detect_voice(
     request: Request,
@@ -90,12 +137,16 @@ async def detect_voice(
             }
         )
     try:
-        # Decode Audio (Async Threadpool)
-        # Run CPU-intensive decoding in a separate thread to keep server responsive
-        y, sr = await run_in_threadpool(decode_audio, payload.audioBase64)
+        audio_hash = hashlib.blake2b(payload.audioBase64.encode()).digest()
+        result = result_cache.get(audio_hash)
+        
+        if result is None:
+            # Decode + Predict in the process pool
+            # Runs off the event loop and outside this process's GIL
+            result = await run_clip(request.app.state, payload.audioBase64)
+            result_cache[audio_hash] = result
         
-        # Predict
-        classification, confidence, explanation = classifier.predict(y, sr)
+        classification, confidence, explanation = result
         
         return {
             "status": "success",
@@ -1,10 +1,52 @@
 import numpy as np
 import librosa
 import logging
+from numba import njit
 
 # Setup logging
+# Child of the "voice_guard" logger so records (and their `extra` fields)
+# go through the JSON handler from utils.setup_logging
 logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+logger = logging.getLogger("voice_guard.model")
+
+@njit(cache=True, fastmath=True)
+def _rel_mean_abs_diff(x):
+    """
+    Mean absolute difference between consecutive samples, relative to the mean.
+    Single pass with no temporaries; callers guarantee len(x) >= 2.
+    """
+    n = len(x)
+    diff_sum = 0.0
+    total = float(x[0])
+    for i in range(1, n):
+        diff_sum += abs(x[i] - x[i - 1])
+        total += x[i]
+    if total <= 0:
+        return 0.0
+    return (diff_sum / (n - 1)) / (total / n)
+
+@njit(cache=True, fastmath=True)
+def _rms_stats(rms, silence_threshold):
+    """
+    Shimmer (relative mean absolute RMS difference) and silence ratio
+    (fraction of frames below silence_threshold) in a single pass over rms.
+    """
+    n = len(rms)
+    if n == 0:
+        return 0.0, 0.0
+    total = 0.0
+    diff_sum = 0.0
+    silent = 0
+    for i in range(n):
+        total += rms[i]
+        if rms[i] < silence_threshold:
+            silent += 1
+        if i > 0:
+            diff_sum += abs(rms[i] - rms[i - 1])
+    silence_ratio = silent / n
+    if n < 2 or total <= 0:
+        return 0.0, silence_ratio
+    return (diff_sum / (n - 1)) / (total / n), silence_ratio
 
 class VoiceClassifier:
     def __init__(self):
@@ -14,6 +56,23 @@ class VoiceClassifier:
         self.SHIMMER_THRESHOLD = 0.05  # 5% - AI voices have consistent amplitude
         self.HNR_THRESHOLD = 15.0  # dB - Low HNR suggests noise/artifacts
         self.SILENCE_RATIO_THRESHOLD = 0.05
+        self.SILENCE_RMS_THRESHOLD = 0.01  # Frames below this RMS count as pauses
+        self.VOICED_FLATNESS_THRESHOLD = 0.1  # Noise-like (unvoiced) frames are flatter than this
+        self.VOICED_DB_BELOW_PEAK = 30.0  # Voiced frames are within this many dB of the clip's loud frames
+        self.SILENT_PEAK_THRESHOLD = 0.001  # Below this the clip is effectively silent
+        self.SILENT_ENERGY_THRESHOLD = 1e-8  # Mean signal power
+
+        # Analysis frames: ~93ms window, ~23ms hop at 8 kHz, the same durations as
+        # the 2048/512 frames at 22050 Hz the thresholds were calibrated on
+        self.FRAME_LENGTH = 744
+        self.HOP_LENGTH = 186
+        # RMS from the Hann-windowed STFT reads ~0.61x the time-domain RMS;
+        # dividing by the window's RMS gain restores the scale the thresholds use
+        self.WINDOW_RMS_GAIN = float(np.sqrt(np.mean(librosa.filters.get_window('hann', self.FRAME_LENGTH) ** 2)))
+
+        # Pitch search range (C2-C7), resolved once instead of per request
+        self.FMIN = librosa.note_to_hz('C2')
+        self.FMAX = librosa.note_to_hz('C7')
         
     def preemphasis(self, signal, coeff=0.97):
         """
@@ -21,7 +80,11 @@ class VoiceClassifier:
         This balances the spectrum by boosting high frequencies, 
         helping to reduce the effect of low-frequency noise.
         """
-        return np.append(signal[0], signal[1:] - coeff * signal[:-1])
+        # Write into a preallocated buffer instead of concatenating with np.append
+        emphasized = np.empty_like(signal)
+        emphasized[0] = signal[0]
+        np.subtract(signal[1:], coeff * signal[:-1], out=emphasized[1:])
+        return emphasized
 
     def calculate_jitter(self, y, sr, f0):
         """
@@ -36,37 +99,29 @@ class VoiceClassifier:
             if len(f0_voiced) < 2:
                 return 0.0
             
-            # Calculate period from frequency
-            periods = 1.0 / f0_voiced
+            # Calculate period from frequency (float32 scalar avoids promoting to float64)
+            periods = np.float32(1.0) / f0_voiced.astype(np.float32, copy=False)
             
             # Jitter is the average absolute difference between consecutive periods
-            period_diffs = np.abs(np.diff(periods))
-            jitter = np.mean(period_diffs) / np.mean(periods) if np.mean(periods) > 0 else 0
+            jitter = _rel_mean_abs_diff(periods)
             
             return float(jitter)
         except:
             return 0.0
 
-    def calculate_shimmer(self, y, sr):
+    def calculate_shimmer_and_silence(self, rms):
         """
-        Calculate shimmer (amplitude variation).
+        Calculate shimmer (amplitude variation) and the silence ratio.
         Shimmer measures variations in amplitude between periods.
-        AI voices often have very consistent amplitude.
+        AI voices often have very consistent amplitude and few natural pauses.
+        Takes the framewise RMS energy (amplitude proxy) computed in extract_features;
+        both statistics come from one fused pass over it.
         """
         try:
-            # Use RMS energy as amplitude proxy
-            rms = librosa.feature.rms(y=y, frame_length=2048, hop_length=512)[0]
-            
-            if len(rms) < 2:
-                return 0.0
-            
-            # Shimmer is the average absolute difference in amplitude
-            rms_diffs = np.abs(np.diff(rms))
-            shimmer = np.mean(rms_diffs) / np.mean(rms) if np.mean(rms) > 0 else 0
-            
-            return float(shimmer)
+            shimmer, silence_ratio = _rms_stats(rms, self.SILENCE_RMS_THRESHOLD)
+            return float(shimmer), float(silence_ratio)
         except:
-            return 0.0
+            return 0.0, 0.0
 
     def calculate_hnr(self, y, sr):
         """
@@ -76,24 +131,26 @@ class VoiceClassifier:
         """
         try:
             # Use autocorrelation to estimate HNR
-            autocorr = librosa.autocorrelate(y)
+            autocorr = librosa.autocorrelate(y.astype(np.float32, copy=False))
             
             # Find first peak (fundamental period)
-            peaks = []
-            for i in range(1, min(len(autocorr), sr // 50)):  # Search up to 50Hz
-                if i > 0 and i < len(autocorr) - 1:
-                    if autocorr[i] > autocorr[i-1] and autocorr[i] > autocorr[i+1]:
-                        peaks.append((i, autocorr[i]))
+            # Vectorized local-maximum test over lags below sr // 50 (search up to 50Hz)
+            search = autocorr[:min(len(autocorr) - 1, sr // 50) + 1]
+            mid = search[1:-1]
+            peaks = np.flatnonzero((mid > search[:-2]) & (mid > search[2:])) + 1
             
-            if not peaks:
+            if len(peaks) == 0:
                 return 10.0  # Default moderate value
             
             # Get strongest peak
-            peak_idx, peak_val = max(peaks, key=lambda x: x[1])
+            peak_idx = int(peaks[np.argmax(autocorr[peaks])])
+            peak_val = autocorr[peak_idx]
             
             # HNR estimate: ratio of signal to noise
+            # Noise window spans a fixed ~2.3ms of lags (50 at 22050Hz) at any sample rate
+            noise_lags = sr // 441
             signal_power = peak_val
-            noise_power = np.mean(autocorr[peak_idx+1:peak_idx+50]) if peak_idx+50 < len(autocorr) else np.mean(autocorr[peak_idx+1:])
+            noise_power = np.mean(autocorr[peak_idx+1:peak_idx+noise_lags]) if peak_idx+noise_lags < len(autocorr) else np.mean(autocorr[peak_idx+1:])
             
             if noise_power > 0:
                 hnr_db = 10 * np.log10(signal_power / noise_power)
@@ -109,17 +166,35 @@ class VoiceClassifier:
         # 0. Noise Resilience: Apply Pre-emphasis
         y_proc = self.preemphasis(y)
 
-        # 1. Pitch (Fundamental Frequency - F0) - OPTIMIZED with pyin
-        # pyin is faster and more accurate than piptrack for voice
+        # Single STFT shared by the energy and spectral features below
+        S = np.abs(librosa.stft(y, n_fft=self.FRAME_LENGTH, hop_length=self.HOP_LENGTH, dtype=np.complex64))
+        rms = librosa.feature.rms(S=S, frame_length=self.FRAME_LENGTH)[0] / self.WINDOW_RMS_GAIN
+        frame_flatness = librosa.feature.spectral_flatness(S=S)[0]
+
+        # 1. Pitch (Fundamental Frequency - F0) - OPTIMIZED with yin
+        # yin skips pyin's Viterbi decoding and is an order of magnitude faster
         try:
-            f0, voiced_flag, voiced_probs = librosa.pyin(
+            f0 = librosa.yin(
                 y_proc,
-                fmin=librosa.note_to_hz('C2'),
-                fmax=librosa.note_to_hz('C7'),
+                fmin=self.FMIN,
+                fmax=self.FMAX,
                 sr=sr,
-                frame_length=2048
+                frame_length=self.FRAME_LENGTH,
+                hop_length=self.HOP_LENGTH
+            ).astype(np.float32)  # yin returns float64; cast once
+
+            # yin reports a pitch for every frame, so gate voicing the way pyin did:
+            # drop frames clipped to [fmin, fmax], frames far below the clip's own
+            # level (pauses; relative, so quiet recordings still count as voiced)
+            # and noise-like frames (fricatives, breath); unvoiced frames become NaN
+            level_floor = np.percentile(rms, 95) * 10 ** (-self.VOICED_DB_BELOW_PEAK / 20)
+            voiced_flag = (
+                (f0 > self.FMIN) & (f0 < self.FMAX)
+                & (rms >= level_floor)
+                & (frame_flatness < self.VOICED_FLATNESS_THRESHOLD)
             )
-            
+            f0 = np.where(voiced_flag, f0, np.nan)
+
             pitch_values = f0[voiced_flag]
             
             if len(pitch_values) == 0:
@@ -130,7 +205,7 @@ class VoiceClassifier:
                 pitch_mean = np.mean(pitch_values)
                 
         except Exception as e:
-            logger.warning(f"Pitch extraction failed: {e}")
+            logger.warning("Pitch extraction failed: %s", e)
             pitch_std = 0
             pitch_mean = 0
             f0 = np.array([])
@@ -138,20 +213,14 @@ class VoiceClassifier:
         # 2. Jitter (NEW)
         jitter = self.calculate_jitter(y, sr, f0 if len(f0) > 0 else np.array([]))
         
-        # 3. Shimmer (NEW)
-        shimmer = self.calculate_shimmer(y, sr)
+        # 3. Shimmer (NEW) + 6. Silence/Pause analysis
+        shimmer, silence_ratio = self.calculate_shimmer_and_silence(rms)
         
         # 4. Harmonic-to-Noise Ratio (NEW)
         hnr = self.calculate_hnr(y, sr)
         
         # 5. Spectral Flatness
-        flatness = np.mean(librosa.feature.spectral_flatness(y=y))
-        
-        # 6. Silence/Pause analysis
-        rms = librosa.feature.rms(y=y)[0]
-        silence_frames = np.sum(rms < 0.01)
-        total_frames = len(rms)
-        silence_ratio = silence_frames / total_frames if total_frames > 0 else 0
+        flatness = np.mean(frame_flatness)
         
         return {
             "pitch_std": float(pitch_std),
@@ -168,6 +237,13 @@ class VoiceClassifier:
         Classifies audio as AI_GENERATED or HUMAN based on advanced features.
         Returns: classification, confidence, explanation
         """
+        # Skip feature extraction for (near-)silent audio: there is no voice to analyze
+        peak = max(float(y.max()), -float(y.min()))
+        energy = float(np.dot(y, y)) / len(y)
+        if peak < self.SILENT_PEAK_THRESHOLD or energy < self.SILENT_ENERGY_THRESHOLD:
+            logger.info("classified", extra={"classification": "HUMAN", "confidence": 0.5, "features": {"silent": True}})
+            return "HUMAN", 0.5, "Audio is silent or near-silent; no voice characteristics to analyze"
+        
         features = self.extract_features(y, sr)
         
         score = 0
@@ -257,7 +333,11 @@ class VoiceClassifier:
                 main_explanation = "Natural pitch variation and prosody detected"
             
         # Log classification for monitoring
-        logger.info(f"Classification: {classification} | Confidence: {confidence} | Features: {feature_scores}")
+        logger.info("classified", extra={
+            "classification": classification,
+            "confidence": confidence,
+            "features": feature_scores
+        })
         
         return classification, round(confidence, 2), main_explanation
 
@@ -0,0 +1,11 @@
+from model import classifier
+from utils import decode_audio
+
+def decode_and_predict(audio_base64):
+    """
+    Decodes one base64 MP3 payload and classifies it inside a process-pool
+    worker. The module-level classifier is created once per worker and
+    reused, so every clip after the first runs on a warm instance.
+    """
+    y, sr = decode_audio(audio_base64)
+    return classifier.predict(y, sr)